@@ -4,6 +4,11 @@ import socket
 import threading
 import time
 
+try:
+    from lab1.tppo_multicast_6121 import MulticastSubscriber
+except ImportError:
+    from tppo_multicast_6121 import MulticastSubscriber
+
 logging.basicConfig(filename='logs/client_notifications.log',
                     filemode='a+',
                     format='%(asctime)s,%(msecs)d %(name)s %(levelname)s %(message)s',
@@ -85,6 +90,10 @@ class BedReanimationClient:
             14: {
                 "command": "commands",
                 "help": "Show commands"
+            },
+            15: {
+                "command": "wait_change",
+                "help": "Wait for change of the bed state after the given version"
             }
         }
         self.host = host
@@ -107,6 +116,19 @@ class BedReanimationClient:
             except Exception as e:
                 pass
 
+    def listen_multicast(self, subscriber: MulticastSubscriber) -> None:
+        global STOP_THREADS
+        while not STOP_THREADS:
+            try:
+                for seq, kind, values in subscriber.receive(timeout=1):
+                    if kind == 'angles':
+                        logger.info(f"!Notify! #{seq} New angles: back={values[0]}, hip={values[1]}, ankle={values[2]}")
+                    else:
+                        logger.info(f"!Notify! #{seq} New {kind} is {values[0]}")
+            except Exception as e:
+                logger.error(f'multicast: {e}')
+        subscriber.close()
+
     def start_transmitter(self) -> None:
         global STOP_THREADS
         try:
@@ -136,6 +158,11 @@ class BedReanimationClient:
                                 exit(0)
                             elif command == 14:
                                 self.help_commands()
+                            elif command == 15:
+                                version = input("Enter version: ")
+                                timeout = input("Enter timeout (seconds): ")
+                                self.send(f"{self.COMMANDS[command]['command']} {version} {timeout}")
+                                print(f"Received: {self.receive()}")
                     else:
                         print("Wrong command")
                 else:
@@ -185,12 +212,24 @@ if __name__ == '__main__':
     parser.add_argument('--host', help='Server address', default='127.0.0.1', type=str)
     parser.add_argument('-p', '--port', help='Server port', default=8000, type=int)
     parser.add_argument('-n', '--notify_port', help='Server port', default=8001, type=int)
+    parser.add_argument('-g', '--multicast_group', help='Multicast group for notifications', default=None, type=str)
+    parser.add_argument('-m', '--multicast_port', help='Multicast port for notifications', default=8002, type=int)
+    parser.add_argument('-r', '--resend_port', help='Server port for multicast resend requests', default=8003,
+                        type=int)
+    parser.add_argument('-i', '--multicast_interface', help='Interface address for multicast', default='0.0.0.0',
+                        type=str)
     args = parser.parse_args()
     client = BedReanimationClient(args.host, args.port, args.notify_port)
     try:
         t2 = threading.Thread(target=client.listen_notifications)
         t2.daemon = True
         t2.start()
+        if args.multicast_group:
+            subscriber = MulticastSubscriber(args.multicast_group, args.multicast_port, args.host, args.resend_port,
+                                             args.multicast_interface)
+            t3 = threading.Thread(target=client.listen_multicast, args=(subscriber,))
+            t3.daemon = True
+            t3.start()
         client.start_transmitter()
         t2.join()
     except (KeyboardInterrupt, Exception):
@@ -0,0 +1,185 @@
+"""
+Пакетный импорт истории показаний реанимационной кровати.
+Формат строк совпадает с файлом устройства: back,hip,ankle,height,weight
+Файл читается блоками строк, каждый блок разбирается и проверяется
+целиком средствами NumPy с теми же диапазонами, что и BedReanimation.validate.
+Строки, которые не удалось разобрать или которые вышли за диапазон,
+возвращаются по номеру строки в файле (с нуля).
+"""
+import argparse
+import logging
+import os
+import time
+from itertools import islice
+
+import numpy as np
+
+try:
+    from lab1.tppo_server_6121 import BedReanimation
+except ImportError:
+    from tppo_server_6121 import BedReanimation
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+logger = logging.getLogger(__name__)
+
+FIELDS = ('back', 'hip', 'ankle', 'height', 'weight')
+LOWS = np.array([BedReanimation.LIMITS[field][0] for field in FIELDS], dtype=np.int64)
+HIGHS = np.array([BedReanimation.LIMITS[field][1] for field in FIELDS], dtype=np.int64)
+
+
+class BedTrace:
+    """Загруженная история показаний: одна строка массива - одно показание."""
+
+    def __init__(self, data: np.ndarray, rows: np.ndarray, parse_errors: np.ndarray, range_errors: np.ndarray):
+        self.data = data
+        self.rows = rows
+        self.parse_errors = parse_errors
+        self.range_errors = range_errors
+
+    @property
+    def bad_rows(self) -> np.ndarray:
+        return np.union1d(self.parse_errors, self.range_errors)
+
+    def column(self, name: str) -> np.ndarray:
+        return self.data[:, FIELDS.index(name)]
+
+    def select(self, **ranges) -> 'BedTrace':
+        """Отбирает показания по диапазонам, например select(weight=(80, 120), back=(0, 10))."""
+        mask = np.ones(len(self.data), dtype=bool)
+        for name, (low, high) in ranges.items():
+            column = self.column(name)
+            mask &= (column >= low) & (column <= high)
+        return BedTrace(self.data[mask], self.rows[mask], self.parse_errors, self.range_errors)
+
+    def summary(self) -> dict:
+        if not len(self.data):
+            return {}
+        return {
+            name: {
+                'min': int(self.data[:, i].min()),
+                'max': int(self.data[:, i].max()),
+                'mean': float(self.data[:, i].mean()),
+            } for i, name in enumerate(FIELDS)
+        }
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __str__(self) -> str:
+        return f'rows: {len(self.data)}, parse errors: {len(self.parse_errors)}, ' \
+               f'range errors: {len(self.range_errors)}'
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class BedTraceImport:
+    # блоки не длиннее этого разбираются построчно
+    BISECT_LIMIT = 64
+
+    def __init__(self, chunk_size: int = 1_000_000):
+        self.chunk_size = chunk_size
+
+    def load(self, path: str) -> BedTrace:
+        data, rows, parse_errors, range_errors = [], [], [], []
+        offset = 0
+        with open(path, 'r') as file:
+            while True:
+                lines = list(islice(file, self.chunk_size))
+                if not lines:
+                    break
+                chunk, chunk_rows, chunk_parse_errors = self.parse_chunk(lines, offset)
+                chunk, chunk_rows, chunk_range_errors = self.validate_chunk(chunk, chunk_rows)
+                data.append(chunk)
+                rows.append(chunk_rows)
+                parse_errors.append(chunk_parse_errors)
+                range_errors.append(chunk_range_errors)
+                offset += len(lines)
+        if not data:
+            empty = np.empty(0, dtype=np.int64)
+            return BedTrace(np.empty((0, len(FIELDS)), dtype=np.int16), empty, empty, empty)
+        trace = BedTrace(np.concatenate(data), np.concatenate(rows),
+                         np.concatenate(parse_errors), np.concatenate(range_errors))
+        if len(trace.bad_rows):
+            logger.error(f'bed_trace_import: {path}: {len(trace.parse_errors)} rows are not parsed, '
+                         f'{len(trace.range_errors)} rows are out of range')
+        return trace
+
+    def parse_chunk(self, lines: list, offset: int = 0):
+        """Разбирает блок строк целиком. Пустые строки пропускаются, испорченные ищутся делением блока пополам."""
+        rows = np.arange(offset, offset + len(lines))
+        if not any(line.strip() for line in lines):
+            empty = np.empty(0, dtype=np.int64)
+            return np.empty((0, len(FIELDS)), dtype=np.int64), empty, empty
+        chunk = self.load_lines(lines)
+        if chunk is not None and len(chunk) == len(lines):
+            return chunk, rows, np.empty(0, dtype=np.int64)
+        # loadtxt пропускает пустые строки, без них номера строк разъедутся
+        keep = [i for i, line in enumerate(lines) if line.strip()]
+        if len(keep) != len(lines):
+            lines = [lines[i] for i in keep]
+            rows = rows[keep]
+            if chunk is not None and len(chunk) == len(lines):
+                return chunk, rows, np.empty(0, dtype=np.int64)
+        return self.bisect_chunk(lines, rows)
+
+    def bisect_chunk(self, lines: list, rows: np.ndarray):
+        """Делит блок пополам, пока испорченные строки не окажутся в коротких блоках, и разбирает их построчно."""
+        if len(lines) > self.BISECT_LIMIT:
+            chunk = self.load_lines(lines)
+            if chunk is not None and len(chunk) == len(lines):
+                return chunk, rows, np.empty(0, dtype=np.int64)
+            middle = len(lines) // 2
+            left = self.bisect_chunk(lines[:middle], rows[:middle])
+            right = self.bisect_chunk(lines[middle:], rows[middle:])
+            return tuple(np.concatenate(parts) for parts in zip(left, right))
+        values, good, errors = [], [], []
+        for i, line in zip(rows.tolist(), lines):
+            try:
+                row = [int(value) for value in line.split(',')]
+                if len(row) != len(FIELDS):
+                    raise ValueError(f'expected {len(FIELDS)} values, got {len(row)}')
+                # int() принимает любые числа, значения вне int64 - такая же ошибка разбора, как у loadtxt
+                values.append(np.array(row, dtype=np.int64))
+                good.append(i)
+            except (ValueError, OverflowError):
+                errors.append(i)
+        chunk = np.array(values, dtype=np.int64).reshape(-1, len(FIELDS))
+        return chunk, np.array(good, dtype=np.int64), np.array(errors, dtype=np.int64)
+
+    @staticmethod
+    def load_lines(lines: list):
+        if not lines:
+            return np.empty((0, len(FIELDS)), dtype=np.int64)
+        try:
+            chunk = np.loadtxt(lines, delimiter=',', dtype=np.int64, comments=None, ndmin=2)
+        except ValueError:
+            return None
+        return chunk if chunk.shape[1] == len(FIELDS) else None
+
+    @staticmethod
+    def validate_chunk(chunk: np.ndarray, rows: np.ndarray):
+        """Векторный аналог BedReanimation.validate для блока показаний."""
+        bad = ((chunk < LOWS) | (chunk > HIGHS)).any(axis=1)
+        return chunk[~bad].astype(np.int16), rows[~bad], rows[bad]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-f', '--file', help='path to file with exported readings', default=f'{dir_path}/device.csv')
+    parser.add_argument('-c', '--chunk-size', help='rows parsed per batch', default=1_000_000, type=int)
+    parser.add_argument('-s', '--show', help='how many bad rows to print', default=10, type=int)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    trace = BedTraceImport(args.chunk_size).load(args.file)
+    elapsed = time.perf_counter() - start
+    total = len(trace) + len(trace.bad_rows)
+    print(trace)
+    print(f'{total} rows in {elapsed:.3f} s ({total / elapsed if elapsed else 0:,.0f} rows/s)')
+    if len(trace.parse_errors):
+        print(f'not parsed rows: {trace.parse_errors[:args.show].tolist()}')
+    if len(trace.range_errors):
+        print(f'out of range rows: {trace.range_errors[:args.show].tolist()}')
+    for name, stats in trace.summary().items():
+        print(f"{name}: min={stats['min']}, max={stats['max']}, mean={stats['mean']:.2f}")
@@ -0,0 +1,238 @@
+"""
+Рассылка уведомлений реанимационной кровати через UDP multicast.
+Каждое изменение публикуется один раз датаграммой с порядковым номером
+в заданную группу, вместо отдельного sendall каждому TCP-подписчику.
+Формат датаграммы (Binary, network byte order):
+    session: uint32, seq: uint32, kind: uint8 (0 - углы, 1 - высота, 2 - вес), values: 3 x int16
+Для высоты и веса используется только первое значение. session выбирается
+случайно при запуске сервера: после перезапуска номера начинаются с 1 заново,
+и клиент по смене session начинает отсчёт номеров сначала.
+Потерянные датаграммы клиент запрашивает повторно по unicast UDP на порт
+повторной отправки: запрос - три uint32 (session, первый и последний номер
+включительно), ответ - те же датаграммы, пока они есть в истории сервера,
+не больше RESEND_LIMIT на один запрос.
+Раз в heartbeat_interval сервер публикует heartbeat (kind 3) с последним
+выданным номером, чтобы клиент заметил потерю и последнего изменения в серии.
+"""
+import logging
+import random
+import selectors
+import socket
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DATAGRAM = struct.Struct('!IIBhhh')
+RESEND_REQUEST = struct.Struct('!III')
+RESEND_LIMIT = 256
+
+KIND_ANGLES = 0
+KIND_HEIGHT = 1
+KIND_WEIGHT = 2
+KIND_HEARTBEAT = 3
+KINDS = {KIND_ANGLES: 'angles', KIND_HEIGHT: 'height', KIND_WEIGHT: 'weight'}
+
+
+class MulticastPublisher:
+
+    def __init__(self, group: str, port: int = 8002, resend_port: int = 8003, interface: str = '0.0.0.0',
+                 ttl: int = 1, history: int = 4096, heartbeat_interval: float = 1.0):
+        self.group = group
+        self.port = port
+        self.resend_port = resend_port
+        self.interface = interface
+        self.session = random.getrandbits(32)
+        self.seq = 0
+        self.history = OrderedDict()
+        self.history_size = history
+        self.heartbeat_interval = heartbeat_interval
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.resend_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.resend_sock.bind((interface, resend_port))
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+        if interface != '0.0.0.0':
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface))
+
+    def publish(self, kind: int, first: int, second: int = 0, third: int = 0) -> int:
+        with self.lock:
+            self.seq = (self.seq + 1) & 0xFFFFFFFF
+            datagram = DATAGRAM.pack(self.session, self.seq, kind, first, second, third)
+            self.history[self.seq] = datagram
+            while len(self.history) > self.history_size:
+                self.history.popitem(last=False)
+            seq = self.seq
+        self.send(datagram)
+        return seq
+
+    def send(self, datagram: bytes) -> None:
+        try:
+            self.sock.sendto(datagram, (self.group, self.port))
+        except OSError as e:
+            logger.error(f'[publish] bed_reanimation: multicast datagram is not sent: {e}')
+
+    def send_heartbeat(self) -> None:
+        with self.lock:
+            datagram = DATAGRAM.pack(self.session, self.seq, KIND_HEARTBEAT, 0, 0, 0)
+        self.send(datagram)
+
+    def publish_angles(self, back: int, hip: int, ankle: int) -> int:
+        return self.publish(KIND_ANGLES, back, hip, ankle)
+
+    def publish_height(self, height: int) -> int:
+        return self.publish(KIND_HEIGHT, height)
+
+    def publish_weight(self, weight: int) -> int:
+        return self.publish(KIND_WEIGHT, weight)
+
+    def listen_resend(self) -> None:
+        """Отвечает на запросы повторной отправки и между ними рассылает heartbeat, пока не вызван close()."""
+        sock = self.resend_sock
+        next_heartbeat = time.monotonic()
+        while not self.stopped.is_set():
+            now = time.monotonic()
+            if now >= next_heartbeat:
+                self.send_heartbeat()
+                next_heartbeat = now + self.heartbeat_interval
+            try:
+                sock.settimeout(next_heartbeat - now)
+                data, addr = sock.recvfrom(1024)
+            except socket.timeout:
+                continue
+            except OSError as e:
+                if self.stopped.is_set():
+                    # сокет закрыт в close()
+                    break
+                logger.error(f'[listen_resend] bed_reanimation: {e}')
+                continue
+            if self.stopped.is_set():
+                break
+            if len(data) != RESEND_REQUEST.size:
+                logger.error(f'[listen_resend] bed_reanimation: wrong resend request from {addr}')
+                continue
+            session, first, last = RESEND_REQUEST.unpack(data)
+            for datagram in self.resend_datagrams(session, first, last):
+                try:
+                    sock.sendto(datagram, addr)
+                except OSError as e:
+                    logger.error(f'[listen_resend] bed_reanimation: resend to {addr} failed: {e}')
+                    break
+
+    def resend_datagrams(self, session: int, first: int, last: int) -> list:
+        """Датаграммы из истории в пределах [first, last], не больше RESEND_LIMIT."""
+        with self.lock:
+            if session != self.session or not self.history:
+                return []
+            # номера в истории идут подряд, запрос ограничивается ими
+            first = max(first, next(iter(self.history)))
+            last = min(last, self.seq, first + RESEND_LIMIT - 1)
+            return [self.history[seq] for seq in range(first, last + 1)]
+
+    def close(self) -> None:
+        self.stopped.set()
+        try:
+            # будит listen_resend, ждущий запрос, чтобы порт освободился сразу
+            self.resend_sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.resend_sock.close()
+        self.sock.close()
+
+
+class MulticastSubscriber:
+    """Клиентская часть: восстанавливает порядок датаграмм и запрашивает пропущенные."""
+
+    def __init__(self, group: str, port: int, server_host: str, resend_port: int, interface: str = '0.0.0.0',
+                 gap_timeout: float = 1.0):
+        self.server = (server_host, resend_port)
+        self.gap_timeout = gap_timeout
+        self.session = None
+        self.expected = None
+        # последний номер, о котором известно из датаграмм или heartbeat
+        self.latest = None
+        self.pending = {}
+        self.gap_since = None
+        self.lost = 0
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, 'SO_REUSEPORT'):
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self.sock.bind(('', port))
+        membership = socket.inet_aton(group) + socket.inet_aton(interface)
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        self.resend_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.sock, selectors.EVENT_READ)
+        self.selector.register(self.resend_sock, selectors.EVENT_READ)
+
+    def receive(self, timeout: float = None) -> list:
+        """Возвращает по порядку номеров доставленные обновления: [(seq, kind, values), ...]."""
+        updates = []
+        if self.gap_since is not None:
+            timeout = self.gap_timeout if timeout is None else min(timeout, self.gap_timeout)
+        for key, _ in self.selector.select(timeout):
+            data = key.fileobj.recv(1024)
+            if len(data) == DATAGRAM.size:
+                updates.extend(self.handle(data))
+        if self.gap_since is not None and time.monotonic() - self.gap_since > self.gap_timeout:
+            updates.extend(self.skip_gap())
+        return updates
+
+    def handle(self, datagram: bytes) -> list:
+        session, seq, kind, *values = DATAGRAM.unpack(datagram)
+        if session != self.session:
+            if self.session is not None:
+                logger.info('bed_reanimation: multicast session changed, server was restarted')
+            self.session = session
+            # heartbeat несёт уже выданный номер, следующее изменение будет за ним
+            self.expected = seq + 1 if kind == KIND_HEARTBEAT else seq
+            self.latest = self.expected - 1
+            self.pending.clear()
+            self.gap_since = None
+        self.latest = max(self.latest, seq)
+        if kind == KIND_HEARTBEAT:
+            return self.deliver()
+        if seq < self.expected or seq in self.pending:
+            return []
+        self.pending[seq] = (seq, KINDS.get(kind, kind), values)
+        return self.deliver()
+
+    def deliver(self) -> list:
+        updates = []
+        while self.expected in self.pending:
+            updates.append(self.pending.pop(self.expected))
+            self.expected += 1
+        if self.expected <= self.latest:
+            if self.gap_since is None or updates:
+                self.gap_since = time.monotonic()
+                self.request_resend(self.expected, min(self.pending) - 1 if self.pending else self.latest)
+        else:
+            self.gap_since = None
+        return updates
+
+    def skip_gap(self) -> list:
+        # история сервера уже не содержит пропуск, актуальное значение можно запросить командой get_*
+        first = min(self.pending) if self.pending else self.latest + 1
+        self.lost += first - self.expected
+        logger.error(f'bed_reanimation: multicast updates {self.expected}..{first - 1} are lost')
+        self.expected = first
+        self.gap_since = None
+        return self.deliver()
+
+    def request_resend(self, first: int, last: int) -> None:
+        try:
+            self.resend_sock.sendto(RESEND_REQUEST.pack(self.session, first, last), self.server)
+        except OSError as e:
+            logger.error(f'bed_reanimation: resend request {first}..{last} is not sent: {e}')
+
+    def close(self) -> None:
+        self.selector.close()
+        self.sock.close()
+        self.resend_sock.close()
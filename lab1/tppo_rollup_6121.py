@@ -0,0 +1,124 @@
+"""
+Агрегация истории параметров реанимационной кровати для графиков трендов.
+Для каждого параметра (back, hip, ankle, height, weight) и каждого разрешения
+(по умолчанию 1 с, 1 мин, 1 ч) хранятся корзины min/max/mean/last.
+Корзины обновляются по мере применения изменений в BedReanimation, сырые
+показания не хранятся. Устройство сообщает только изменения, поэтому значение
+считается неизменным до следующего изменения: оно учитывается во всех корзинах,
+через которые прошло, а mean взвешивается по времени, а не по числу изменений.
+Время передаётся по возрастанию, более ранние отметки не учитываются в mean.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+PARAMETERS = ('back', 'hip', 'ankle', 'height', 'weight')
+RESOLUTIONS = (1, 60, 3600)
+
+
+class Bucket:
+    __slots__ = ('start', 'min', 'max', 'area', 'covered', 'last', 'count')
+
+    def __init__(self, start: int, value: int):
+        self.start = start
+        self.min = value
+        self.max = value
+        self.area = 0.0
+        self.covered = 0.0
+        self.last = value
+        self.count = 0
+
+    def hold(self, value: int, seconds: float) -> None:
+        """Учитывает, что значение держалось seconds секунд внутри корзины."""
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.area += value * seconds
+        self.covered += seconds
+
+    def change(self, value: int) -> None:
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.last = value
+        self.count += 1
+
+    def to_dict(self) -> dict:
+        return {
+            'start': self.start,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.area / self.covered if self.covered else self.last,
+            'last': self.last,
+            'count': self.count,
+        }
+
+
+class Rollup:
+
+    def __init__(self, resolutions: tuple = RESOLUTIONS, retention: int = 3600):
+        self.resolutions = tuple(sorted(resolutions))
+        self.retention = retention
+        self.lock = threading.Lock()
+        self.buckets = {
+            resolution: {parameter: OrderedDict() for parameter in PARAMETERS}
+            for resolution in self.resolutions
+        }
+        # текущее значение параметра и время, до которого оно уже учтено в корзинах
+        self.values = {}
+
+    def add(self, parameter: str, value: int, timestamp: float = None) -> None:
+        if timestamp is None:
+            timestamp = time.time()
+        with self.lock:
+            self.hold(parameter, timestamp)
+            for resolution in self.resolutions:
+                start = int(timestamp // resolution) * resolution
+                self.bucket(resolution, parameter, start, value).change(value)
+            self.values[parameter] = [value, timestamp]
+
+    def hold(self, parameter: str, timestamp: float) -> None:
+        """Распределяет текущее значение параметра по корзинам до timestamp. Вызывается под self.lock."""
+        held = self.values.get(parameter)
+        if held is None or timestamp <= held[1]:
+            return
+        value, since = held
+        for resolution in self.resolutions:
+            last = int(timestamp // resolution) * resolution
+            # старше retention корзины всё равно будут вытеснены
+            first = max(int(since // resolution) * resolution, last - (self.retention - 1) * resolution)
+            for start in range(first, last + 1, resolution):
+                seconds = min(timestamp, start + resolution) - max(since, start)
+                if seconds > 0:
+                    self.bucket(resolution, parameter, start, value).hold(value, seconds)
+        held[1] = timestamp
+
+    def bucket(self, resolution: int, parameter: str, start: int, value: int) -> Bucket:
+        series = self.buckets[resolution][parameter]
+        bucket = series.get(start)
+        if bucket is None:
+            bucket = series[start] = Bucket(start, value)
+            # выборки приходят по времени, старые корзины - в начале
+            while len(series) > self.retention:
+                series.popitem(last=False)
+        return bucket
+
+    def pick_resolution(self, start: float, end: float, max_points: int = 500) -> int:
+        for resolution in self.resolutions:
+            if (end - start) / resolution <= max_points:
+                return resolution
+        return self.resolutions[-1]
+
+    def query(self, parameter: str, start: float, end: float, resolution: int = None, now: float = None) -> list:
+        if resolution is None:
+            resolution = self.pick_resolution(start, end)
+        if resolution not in self.buckets:
+            raise ValueError(f'resolution {resolution} is not supported')
+        first = int(start // resolution) * resolution
+        with self.lock:
+            # значение, не менявшееся с последнего изменения, доводится до текущего момента
+            self.hold(parameter, time.time() if now is None else now)
+            return [bucket.to_dict() for bucket in self.buckets[resolution][parameter].values()
+                    if first <= bucket.start <= end]
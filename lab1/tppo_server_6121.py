@@ -22,9 +22,15 @@ import logging
 import os
 import socket
 import threading
-import time
 import traceback
 
+try:
+    from lab1.tppo_multicast_6121 import MulticastPublisher
+    from lab1.tppo_rollup_6121 import Rollup
+except ImportError:
+    from tppo_multicast_6121 import MulticastPublisher
+    from tppo_rollup_6121 import Rollup
+
 log_level = logging.DEBUG
 
 dir_path = os.path.dirname(os.path.realpath(__file__))
@@ -47,26 +53,36 @@ def threaded(fn):
 
 
 class BedReanimation:
+    # Допустимые диапазоны параметров устройства (включительно)
+    LIMITS = {
+        'back': (0, 50),
+        'hip': (-15, 15),
+        'ankle': (0, 30),
+        'height': (0, 100),
+        'weight': (0, 300),
+    }
+    MAX_WAIT_TIMEOUT = 60
 
     @staticmethod
     def validate(back: int = None, hip: int = None, ankle: int = None, height: int = None, weight: int = None):
-        if back and not (0 <= back <= 50):
+        if back and not (BedReanimation.LIMITS['back'][0] <= back <= BedReanimation.LIMITS['back'][1]):
             logger.error(f'bed_reanimation: back angle is not valid: {back}')
             raise ValueError('back angle is out of range')
-        if hip and not (-15 <= hip <= 15):
+        if hip and not (BedReanimation.LIMITS['hip'][0] <= hip <= BedReanimation.LIMITS['hip'][1]):
             logger.error(f'bed_reanimation: hip angle is not valid: {hip}')
             raise ValueError('hip angle is out of range')
-        if ankle and not (0 <= ankle <= 30):
+        if ankle and not (BedReanimation.LIMITS['ankle'][0] <= ankle <= BedReanimation.LIMITS['ankle'][1]):
             logger.error(f'bed_reanimation: ankle angle is not valid: {ankle}')
             raise ValueError('ankle angle is out of range')
-        if height and not (0 <= height <= 100):
+        if height and not (BedReanimation.LIMITS['height'][0] <= height <= BedReanimation.LIMITS['height'][1]):
             logger.error(f'bed_reanimation: height is not valid: {height}')
             raise ValueError('height is out of range')
-        if weight and not (0 <= weight <= 300):
+        if weight and not (BedReanimation.LIMITS['weight'][0] <= weight <= BedReanimation.LIMITS['weight'][1]):
             logger.error(f'bed_reanimation: weight is not valid: {weight}')
             raise ValueError('weight is out of range')
 
-    def __init__(self, file, host: str = '0.0.0.0', port: int = 8000, notify_port: int = 8001):
+    def __init__(self, file, host: str = '0.0.0.0', port: int = 8000, notify_port: int = 8001,
+                 multicast: MulticastPublisher = None):
         self.ankle = 0
         self.hip = 0
         self.back = 0
@@ -79,9 +95,15 @@ class BedReanimation:
         self.angles_clients = []
         self.weight_clients = []
         self.height_clients = []
+        self.rollup = Rollup()
+        self.multicast = multicast
+        self.version = 0
+        self.version_changed = threading.Condition()
+        self.version_waiters = []
+        self.stopped = threading.Event()
 
     def listen_file(self):
-        while True:
+        while not self.stopped.is_set():
             try:
                 file = open(self.device_file, 'r')
                 for line in file:
@@ -95,7 +117,7 @@ class BedReanimation:
                         if weight != self.weight:
                             self.set_weight(int(weight))
                             logger.info(f'bed_reanimation: weight is changed: {weight}')
-                    time.sleep(1)
+                    self.stopped.wait(1)
             except FileNotFoundError:
                 file.close()
                 logger.error(f'bed_reanimation: file {self.device_file} not found')
@@ -106,6 +128,9 @@ class BedReanimation:
                 logger.error(f'[listen_file] bed_reanimation: {traceback.format_exc()}')
                 file.close()
 
+    def stop(self) -> None:
+        self.stopped.set()
+
     # ----------------- TCP -----------------
     def start_notify_server(self) -> None:
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
@@ -229,6 +254,16 @@ class BedReanimation:
                                 conn.sendall(self.set_height_to_device(height))
                             except ValueError as e:
                                 conn.sendall(f'Height is not set: {e}'.encode() + b'\n')
+                    elif data.startswith(b'wait_change'):
+                        try:
+                            version, timeout = self.parse_tcp_wait_change(data.decode(encoding='latin-1'))
+                        except ValueError as e:
+                            conn.sendall(f'!Error: {e} \n'.encode())
+                            continue
+                        if self.wait_change(version, timeout):
+                            conn.sendall(self.get_state() + b'\n')
+                        else:
+                            conn.sendall(f'!Timeout: version={self.version} \n'.encode())
                     else:
                         conn.sendall(b'unknown command: "' + data + b'"\n')
         except Exception as e:
@@ -260,14 +295,65 @@ class BedReanimation:
             return self.back, self.hip, self.ankle
         return back, hip, ankle
 
+    def parse_tcp_wait_change(self, data: str):
+        try:
+            _, version, timeout = data.split()
+            version = int(version)
+            timeout = float(timeout)
+        except ValueError:
+            logger.error(f'bed_reanimation: wrong wait_change in tcp: {data}')
+            raise ValueError('format is "wait_change <version> <timeout>"')
+        if not 0 <= timeout <= self.MAX_WAIT_TIMEOUT:
+            raise ValueError(f'timeout must be in range [0, {self.MAX_WAIT_TIMEOUT}]')
+        return version, timeout
+
+    # -------------------versions-------------------
+
+    def bump_version(self) -> None:
+        with self.version_changed:
+            self.version += 1
+            version = self.version
+            waiters, self.version_waiters = self.version_waiters, []
+            self.version_changed.notify_all()
+        for waiter in waiters:
+            try:
+                waiter(version)
+            except Exception as e:
+                logger.error(f'[bump_version] bed_reanimation: waiter failed: {e}')
+
+    def wait_change(self, version: int, timeout: float) -> bool:
+        """Блокирует поток соединения до изменения состояния после version или до истечения timeout."""
+        with self.version_changed:
+            return self.version_changed.wait_for(lambda: self.version > version, timeout)
+
+    def add_version_waiter(self, version: int, waiter) -> bool:
+        """Регистрирует waiter(version) на следующее изменение. False - состояние уже новее version."""
+        with self.version_changed:
+            if self.version > version:
+                return False
+            self.version_waiters.append(waiter)
+            return True
+
+    def remove_version_waiter(self, waiter) -> None:
+        with self.version_changed:
+            if waiter in self.version_waiters:
+                self.version_waiters.remove(waiter)
+
     # -------------------setters-------------------
 
     def set_angles(self, back: int, hip: int, ankle: int) -> None:
         try:
             self.validate(back, hip, ankle)
+            # в историю попадают только изменившиеся углы (и первое значение каждого)
+            for name, value in (('back', back), ('hip', hip), ('ankle', ankle)):
+                if value != getattr(self, name) or name not in self.rollup.values:
+                    self.rollup.add(name, value)
             self.back = back
             self.hip = hip
             self.ankle = ankle
+            if self.multicast:
+                self.multicast.publish_angles(back, hip, ankle)
+            self.bump_version()
             for client in self.angles_clients:
                 try:
                     client.sendall(f"!Notify! New angles: back={back}, hip={hip}, ankle={ankle}".encode())
@@ -290,6 +376,10 @@ class BedReanimation:
         try:
             self.validate(height=height)
             self.height = height
+            self.rollup.add('height', height)
+            if self.multicast:
+                self.multicast.publish_height(height)
+            self.bump_version()
             for client in self.height_clients:
                 try:
                     client.sendall(f"!Notify! New height is {height}".encode())
@@ -312,6 +402,10 @@ class BedReanimation:
         try:
             self.validate(weight=weight)
             self.weight = weight
+            self.rollup.add('weight', weight)
+            if self.multicast:
+                self.multicast.publish_weight(weight)
+            self.bump_version()
             for client in self.weight_clients:
                 try:
                     client.sendall(f"!Notify! New weight is {weight}".encode() + b'\n')
@@ -345,6 +439,10 @@ class BedReanimation:
         bytes_height = f"{self.height}".encode()
         return bytes_height
 
+    def get_state(self) -> bytes:
+        bytes_state = f"{self.version},{self.back},{self.hip},{self.ankle},{self.height},{self.weight}".encode()
+        return bytes_state
+
     # -------------------inner_methods-------------------
 
     def __str__(self) -> str:
@@ -363,6 +461,12 @@ if __name__ == '__main__':
     parser.add_argument('-a', '--address', help='address to listen', default='0.0.0.0')
     parser.add_argument('-p', '--port', help='port to listen', default=8000, type=int)
     parser.add_argument('-l', '--notification-port', help='port to listen for notifications', default=8001, type=int)
+    parser.add_argument('-g', '--multicast-group', help='multicast group for notifications, e.g. 239.0.0.1',
+                        default=None)
+    parser.add_argument('-m', '--multicast-port', help='multicast port for notifications', default=8002, type=int)
+    parser.add_argument('-r', '--resend-port', help='port to listen for multicast resend requests', default=8003,
+                        type=int)
+    parser.add_argument('-i', '--multicast-interface', help='interface address for multicast', default='0.0.0.0')
     parser.add_argument('-d', '--debug', help='debug mode', default=False, type=bool)
 
     if parser.parse_args().debug:
@@ -371,7 +475,14 @@ if __name__ == '__main__':
         logger.setLevel(logging.INFO)
     args = parser.parse_args()
     try:
-        bed = BedReanimation(args.file, args.address, args.port, args.notification_port)
+        multicast = None
+        if args.multicast_group:
+            multicast = MulticastPublisher(args.multicast_group, args.multicast_port, args.resend_port,
+                                           args.multicast_interface)
+            t4 = threading.Thread(target=multicast.listen_resend)
+            t4.daemon = True
+            t4.start()
+        bed = BedReanimation(args.file, args.address, args.port, args.notification_port, multicast)
         t1 = threading.Thread(target=bed.listen_file)
         t1.daemon = True
         t1.start()
@@ -0,0 +1,239 @@
+"""
+Бенчмарк REST API реанимационной кровати.
+Прогоняет все GET/PUT эндпоинты в процессе (ASGI без сети) и через локальный
+сервер uvicorn, выводит запросы в секунду и перцентили задержки.
+Дополнительно измеряется время импорта модуля и холодного старта сервера
+(от запуска процесса до первого успешного ответа).
+Каждый запуск сервера работает со своей временной копией файла устройства,
+lab1/device.csv не изменяется. Сервер запускается с одним воркером: версии
+состояния и история параметров хранятся в памяти процесса.
+Результаты можно сохранить (--output) и сравнить с сохранёнными ранее (--baseline):
+при ухудшении больше чем на --threshold скрипт завершается с кодом 1.
+
+Запуск из корня репозитория:
+    python -m lab2.tppo_bench_6121 --requests 2000 --concurrency 32
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+root_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+ENDPOINTS = [
+    ('GET', '/api/v1/reanimation-bed', None),
+    ('GET', '/api/v1/reanimation-bed/angles', None),
+    ('GET', '/api/v1/reanimation-bed/height', None),
+    ('GET', '/api/v1/reanimation-bed/weight', None),
+    ('GET', '/api/v1/reanimation-bed/changes?version=-1&timeout=0', None),
+    ('GET', '/api/v1/reanimation-bed/history/weight', None),
+    ('PUT', '/api/v1/reanimation-bed/angles', {'back': 30, 'hip': 10, 'ankle': 20}),
+    ('PUT', '/api/v1/reanimation-bed/height', {'height': 80}),
+    ('PUT', '/api/v1/reanimation-bed/weight', {'weight': 90}),
+]
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, round(q / 100 * len(values)) - 1))
+    return values[index]
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def drive(client: httpx.AsyncClient, method: str, url: str, body: dict, requests: int,
+                concurrency: int) -> dict:
+    latencies = []
+    errors = 0
+    left = requests
+
+    async def worker():
+        nonlocal left, errors
+        while left > 0:
+            left -= 1
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, json=body)
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'rps': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p90_ms': percentile(latencies, 90) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'errors': errors,
+    }
+
+
+async def run_endpoints(client: httpx.AsyncClient, requests: int, concurrency: int) -> dict:
+    results = {}
+    for method, url, body in ENDPOINTS:
+        # прогрев, чтобы не учитывать первые обращения к эндпоинту
+        await drive(client, method, url, body, min(requests, 50), concurrency)
+        results[f'{method} {url}'] = await drive(client, method, url, body, requests, concurrency)
+    return results
+
+
+async def bench_in_process(device_file: str, requests: int, concurrency: int) -> dict:
+    from lab1.tppo_server_6121 import BedReanimation
+    from lab2.tppo_rest_6121 import app
+
+    app.state.bed_factory = lambda: BedReanimation(device_file)
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+            return await run_endpoints(client, requests, concurrency)
+
+
+def copy_device_file(tmp_dir: str) -> str:
+    fd, device_file = tempfile.mkstemp(suffix='.csv', dir=tmp_dir)
+    os.close(fd)
+    shutil.copy(os.path.join(root_path, 'lab1', 'device.csv'), device_file)
+    return device_file
+
+
+def start_server(device_file: str, port: int) -> subprocess.Popen:
+    env = dict(os.environ, TPPO_DEVICE_FILE=device_file)
+    return subprocess.Popen([sys.executable, '-m', 'uvicorn', 'lab2.tppo_rest_6121:app', '--host', '127.0.0.1',
+                             '--port', str(port), '--log-level', 'warning'],
+                            cwd=root_path, env=env)
+
+
+def wait_ready(url: str, timeout: float = 30) -> None:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if httpx.get(url).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.01)
+    raise TimeoutError(f'server is not ready: {url}')
+
+
+async def bench_server(device_file: str, requests: int, concurrency: int) -> dict:
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    server = start_server(device_file, port)
+    try:
+        wait_ready(f'{base_url}/api/v1/reanimation-bed')
+        limits = httpx.Limits(max_connections=concurrency)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits) as client:
+            return await run_endpoints(client, requests, concurrency)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def bench_import(repeat: int) -> float:
+    code = 'import time; t = time.perf_counter(); import lab2.tppo_rest_6121; print(time.perf_counter() - t)'
+    times = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', code], cwd=root_path, capture_output=True, text=True,
+                                check=True).stdout
+        times.append(float(output))
+    return statistics.median(times) * 1000
+
+
+def bench_cold_start(tmp_dir: str, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        port = free_port()
+        device_file = copy_device_file(tmp_dir)
+        start = time.perf_counter()
+        server = start_server(device_file, port)
+        try:
+            wait_ready(f'http://127.0.0.1:{port}/api/v1/reanimation-bed')
+            times.append(time.perf_counter() - start)
+        finally:
+            server.terminate()
+            server.wait()
+    return statistics.median(times) * 1000
+
+
+def print_results(title: str, results: dict) -> None:
+    print(f'\n{title}')
+    print(f"{'endpoint':<60}{'req/s':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, stats in results.items():
+        print(f"{name:<60}{stats['rps']:>10.0f}{stats['p50_ms']:>10.2f}{stats['p90_ms']:>10.2f}"
+              f"{stats['p99_ms']:>10.2f}{stats['errors']:>8}")
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Возвращает список ухудшений: меньше req/s или больше времени/задержки, чем в baseline."""
+    regressions = []
+    for mode in ('in_process', 'server'):
+        for name, stats in results.get(mode, {}).items():
+            old = baseline.get(mode, {}).get(name)
+            if not old:
+                continue
+            if stats['rps'] < old['rps'] * (1 - threshold):
+                regressions.append(f"{mode} {name}: req/s {old['rps']:.0f} -> {stats['rps']:.0f}")
+            if stats['p99_ms'] > old['p99_ms'] * (1 + threshold):
+                regressions.append(f"{mode} {name}: p99 {old['p99_ms']:.2f} -> {stats['p99_ms']:.2f} ms")
+    for name in ('import_ms', 'cold_start_ms'):
+        if name in results and name in baseline and results[name] > baseline[name] * (1 + threshold):
+            regressions.append(f'{name}: {baseline[name]:.1f} -> {results[name]:.1f}')
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--requests', help='requests per endpoint', default=1000, type=int)
+    parser.add_argument('-c', '--concurrency', help='concurrent requests', default=16, type=int)
+    parser.add_argument('-r', '--repeat', help='runs for import and cold start time', default=5, type=int)
+    parser.add_argument('--skip-server', help='do not run the local server benchmark', action='store_true')
+    parser.add_argument('-o', '--output', help='save results to json file', default=None)
+    parser.add_argument('-b', '--baseline', help='json file with results to compare with', default=None)
+    parser.add_argument('-t', '--threshold', help='allowed relative regression', default=0.2, type=float)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        results = {'import_ms': bench_import(args.repeat)}
+        print(f"import time: {results['import_ms']:.1f} ms")
+        results['in_process'] = asyncio.run(bench_in_process(copy_device_file(tmp_dir), args.requests,
+                                                             args.concurrency))
+        print_results('in-process (ASGI)', results['in_process'])
+        if not args.skip_server:
+            results['cold_start_ms'] = bench_cold_start(tmp_dir, args.repeat)
+            print(f"\ncold start: {results['cold_start_ms']:.1f} ms")
+            results['server'] = asyncio.run(bench_server(copy_device_file(tmp_dir), args.requests,
+                                                         args.concurrency))
+            print_results('local server (uvicorn)', results['server'])
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        for regression in regressions:
+            print(f'!Regression: {regression}')
+        if regressions:
+            sys.exit(1)
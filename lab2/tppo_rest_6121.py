@@ -1,13 +1,40 @@
+import asyncio
 import os
 import threading
+import time
+from contextlib import asynccontextmanager
+from enum import Enum
+from typing import List, Optional
 
-from fastapi import FastAPI, Body
+from fastapi import FastAPI, Body, Depends, HTTPException, Query, Request
 from pydantic import BaseModel, Field
 from starlette.responses import RedirectResponse
 
 from lab1.tppo_server_6121 import BedReanimation
 
+dir_path = os.path.dirname(os.path.realpath(__file__))
+
+
+def create_bed() -> BedReanimation:
+    return BedReanimation(os.environ.get('TPPO_DEVICE_FILE', f'{dir_path}/../lab1/device.csv'))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Устройство создаётся при запуске приложения, а не при импорте модуля.
+    # Для тестов и бенчмарков фабрику можно подменить через app.state.bed_factory
+    bed = app.state.bed_factory()
+    listener = threading.Thread(target=bed.listen_file)
+    listener.daemon = True
+    listener.start()
+    app.state.bed = bed
+    yield
+    bed.stop()
+    await asyncio.to_thread(listener.join, 2)
+
+
 app = FastAPI(
+    lifespan=lifespan,
     title="Bed Reanimation API",
     description="API for Bed Reanimation",
     version="1.0.0",
@@ -32,15 +59,23 @@ app = FastAPI(
             "name": "weight",
             "description": "Operations with weight",
         },
+        {
+            "name": "changes",
+            "description": "Waiting for changes of the bed state",
+        },
+        {
+            "name": "history",
+            "description": "Aggregated history of the bed parameters",
+        },
     ],
 )
-dir_path = os.path.dirname(os.path.realpath(__file__))
 
 # Rest API for the TPPO lab. Use class from lab1/tppo_server_6121.py as a template for this lab.
-bed = BedReanimation(f'{dir_path}/../lab1/device.csv')
-t1 = threading.Thread(target=bed.listen_file)
-t1.daemon = True
-t1.start()
+app.state.bed_factory = create_bed
+
+
+def get_bed(request: Request) -> BedReanimation:
+    return request.app.state.bed
 
 
 class Angles(BaseModel):
@@ -68,11 +103,40 @@ class Response(BaseModel):
     message: str = Field(description="Message of the request", example="Bed angles changed")
 
 
+class Change(BaseModel):
+    changed: bool = Field(description="False if timeout expired before the state changed", example=True)
+    version: int = Field(description="Current version of the bed state", example=42)
+    bed: ReanimationBed
+
+
+class Parameter(str, Enum):
+    back = "back"
+    hip = "hip"
+    ankle = "ankle"
+    height = "height"
+    weight = "weight"
+
+
+class Bucket(BaseModel):
+    start: int = Field(description="Start of the bucket, unix time in seconds", example=1666000000)
+    min: int = Field(description="Minimal value in the bucket", example=70)
+    max: int = Field(description="Maximal value in the bucket", example=90)
+    mean: float = Field(description="Time-weighted mean of the value in the bucket", example=80.5)
+    last: int = Field(description="Last value in the bucket", example=85)
+    count: int = Field(description="Number of changes in the bucket", example=4)
+
+
+class History(BaseModel):
+    parameter: Parameter
+    resolution: int = Field(description="Bucket size in seconds", example=60)
+    buckets: List[Bucket]
+
+
 @app.get("/api/v1/reanimation-bed",
          response_model=ReanimationBed,
          summary="All parameters of the bed",
          description="Get all parameters of the bed")
-async def get_all():
+async def get_all(bed: BedReanimation = Depends(get_bed)):
     angles_data = bed.get_angles().decode().split(',')
     return {
         "angles": {
@@ -90,7 +154,7 @@ async def get_all():
          tags=["angles"],
          summary="Angles of the bed",
          description="Get angles of the bed")
-async def get_angles():
+async def get_angles(bed: BedReanimation = Depends(get_bed)):
     data = bed.get_angles().decode().split(',')
     return {
         "back": data[0],
@@ -104,7 +168,7 @@ async def get_angles():
          tags=["height"],
          summary="Height of the bed",
          description="Get height of the bed in cm")
-async def get_height():
+async def get_height(bed: BedReanimation = Depends(get_bed)):
     return {"height": bed.get_height().decode()}
 
 
@@ -113,7 +177,7 @@ async def get_height():
          tags=["weight"],
          summary="Weight of the patient",
          description="Get weight of the patient in kg")
-async def get_weight():
+async def get_weight(bed: BedReanimation = Depends(get_bed)):
     return {"weight": bed.get_weight().decode()}
 
 
@@ -122,7 +186,7 @@ async def get_weight():
          tags=["angles"],
          summary="Angles of the bed",
          description="Set angles of the bed")
-async def set_angles(angles: Angles):
+async def set_angles(angles: Angles, bed: BedReanimation = Depends(get_bed)):
     result = bed.set_angles_to_device(angles.back, angles.hip, angles.ankle).decode()
     if '!Success' in result:
         return {"status": "success", "message": "Bed angles changed"}
@@ -135,7 +199,7 @@ async def set_angles(angles: Angles):
          tags=["height"],
          summary="Height of the bed",
          description="Set height of the bed in cm")
-async def set_height(height: Height = Body()):
+async def set_height(height: Height = Body(), bed: BedReanimation = Depends(get_bed)):
     result = bed.set_height_to_device(height.height).decode()
     if '!Success' in result:
         return {"status": "success", "message": "Bed height changed"}
@@ -148,7 +212,7 @@ async def set_height(height: Height = Body()):
          tags=["weight"],
          summary="Weight of the patient",
          description="Set weight of the patient in kg")
-async def set_weight(weight: Weight = Body()):
+async def set_weight(weight: Weight = Body(), bed: BedReanimation = Depends(get_bed)):
     result = bed.set_weight_to_device(weight.weight).decode()
     if '!Success' in result:
         return {"status": "success", "message": "Patient weight changed"}
@@ -156,6 +220,75 @@ async def set_weight(weight: Weight = Body()):
         return {"status": "error", "message": "Patient weight not changed"}
 
 
+async def wait_bed_change(bed: BedReanimation, version: int, timeout: float) -> bool:
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def wake(_version: int) -> None:
+        loop.call_soon_threadsafe(lambda: future.done() or future.set_result(_version))
+
+    if not bed.add_version_waiter(version, wake):
+        return True
+    try:
+        await asyncio.wait_for(future, timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        # в том числе при отмене запроса, когда клиент отключился
+        bed.remove_version_waiter(wake)
+
+
+@app.get("/api/v1/reanimation-bed/changes",
+         response_model=Change,
+         tags=["changes"],
+         summary="Wait for change of the bed",
+         description="Long poll: respond as soon as the bed state version is greater than the given one "
+                     "or when timeout expires")
+async def wait_change(version: int = Query(description="Last known version of the bed state"),
+                      timeout: float = Query(default=30, ge=0, le=BedReanimation.MAX_WAIT_TIMEOUT,
+                                             description="Timeout in seconds"),
+                      bed: BedReanimation = Depends(get_bed)):
+    changed = await wait_bed_change(bed, version, timeout)
+    state = bed.get_state().decode().split(',')
+    return {
+        "changed": changed,
+        "version": state[0],
+        "bed": {
+            "angles": {
+                "back": state[1],
+                "hip": state[2],
+                "ankle": state[3],
+            },
+            "height": state[4],
+            "weight": state[5],
+        },
+    }
+
+
+@app.get("/api/v1/reanimation-bed/history/{parameter}",
+         response_model=History,
+         tags=["history"],
+         summary="History of the parameter",
+         description="Get min/max/mean/last buckets of the parameter. "
+                     "Resolution is picked from the requested range unless set explicitly")
+async def get_history(parameter: Parameter,
+                      start: Optional[float] = Query(default=None, description="Unix time, default is end - 1 hour"),
+                      end: Optional[float] = Query(default=None, description="Unix time, default is now"),
+                      resolution: Optional[int] = Query(default=None, description="Bucket size in seconds"),
+                      bed: BedReanimation = Depends(get_bed)):
+    end = time.time() if end is None else end
+    start = end - 3600 if start is None else start
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be greater than end")
+    resolution = bed.rollup.pick_resolution(start, end) if resolution is None else resolution
+    try:
+        buckets = bed.rollup.query(parameter.value, start, end, resolution)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"parameter": parameter, "resolution": resolution, "buckets": buckets}
+
+
 @app.api_route("/{path_name:path}", methods=["GET"], response_class=RedirectResponse)
 async def read_root():
     return RedirectResponse(url="/docs")
@@ -0,0 +1,77 @@
+import random
+import warnings
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from lab1.tppo_import_6121 import FIELDS, BedTrace, BedTraceImport
+from lab1.tppo_server_6121 import BedReanimation
+
+
+def write(tmp_path, lines):
+    path = tmp_path / 'history.csv'
+    path.write_text(''.join(lines))
+    return str(path)
+
+
+def test_bad_rows_are_reported_by_line_index(tmp_path):
+    lines = ['10,0,5,50,80\n'] * 300
+    lines[7] = 'x,0,5,50,80\n'
+    lines[100] = '10,0,5,50\n'
+    lines[150] = '10,0,5,50,80,1\n'
+    lines[200] = '51,0,5,50,80\n'
+    lines[250] = '10,0,5,50,301\n'
+    trace = BedTraceImport(chunk_size=128).load(write(tmp_path, lines))
+    assert trace.parse_errors.tolist() == [7, 100, 150]
+    assert trace.range_errors.tolist() == [200, 250]
+    assert len(trace) == 295
+    assert 7 not in trace.rows and 299 in trace.rows
+
+
+def test_blank_lines_are_skipped_without_shifting_indices(tmp_path):
+    lines = ['1,0,0,0,0\n', '\n', '2,0,0,0,0\n', '   \n', 'bad\n', '3,0,0,0,0\n', '\n']
+    trace = BedTraceImport().load(write(tmp_path, lines))
+    assert trace.rows.tolist() == [0, 2, 5]
+    assert trace.column('back').tolist() == [1, 2, 3]
+    assert trace.parse_errors.tolist() == [4]
+
+
+def test_range_check_matches_validate(tmp_path):
+    rnd = random.Random(6121)
+    rows = [[rnd.randint(low - 5, high + 5) for low, high in (BedReanimation.LIMITS[f] for f in FIELDS)]
+            for _ in range(2000)]
+    expected = []
+    for i, row in enumerate(rows):
+        try:
+            BedReanimation.validate(*row)
+        except ValueError:
+            expected.append(i)
+    trace = BedTraceImport(chunk_size=500).load(write(tmp_path, [','.join(map(str, row)) + '\n' for row in rows]))
+    assert trace.range_errors.tolist() == expected
+    assert trace.parse_errors.tolist() == []
+
+
+def test_select_and_summary():
+    chunk, rows, _ = BedTraceImport().parse_chunk(['10,0,0,0,80\n', '20,0,0,0,120\n', '30,0,0,0,200\n'])
+    chunk, rows, _ = BedTraceImport.validate_chunk(chunk, rows)
+    trace = BedTrace(chunk, rows, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+    assert trace.select(weight=(100, 300)).rows.tolist() == [1, 2]
+    assert trace.summary()['back'] == {'min': 10, 'max': 30, 'mean': 20.0}
+
+
+@pytest.mark.parametrize('size', [10, 300])
+def test_oversized_field_is_a_parse_error(tmp_path, size):
+    lines = ['10,0,5,50,80\n'] * size
+    lines[5] = '99999999999999999999,0,0,0,0\n'
+    trace = BedTraceImport().load(write(tmp_path, lines))
+    assert trace.parse_errors.tolist() == [5]
+    assert len(trace) == size - 1
+
+
+def test_blank_chunk_is_skipped_without_warning(tmp_path):
+    lines = ['1,0,0,0,0\n'] + ['\n'] * 4 + ['2,0,0,0,0\n']
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        trace = BedTraceImport(chunk_size=2).load(write(tmp_path, lines))
+    assert trace.rows.tolist() == [0, 5]
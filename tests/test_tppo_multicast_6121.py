@@ -0,0 +1,98 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from lab1.tppo_multicast_6121 import RESEND_LIMIT, MulticastPublisher, MulticastSubscriber
+
+GROUP = '239.0.0.61'
+
+
+def free_udp_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def loopback():
+    port, resend_port = free_udp_port(), free_udp_port()
+    publisher = MulticastPublisher(GROUP, port, resend_port, '127.0.0.1', heartbeat_interval=0.2)
+    listener = threading.Thread(target=publisher.listen_resend, daemon=True)
+    listener.start()
+    try:
+        subscriber = MulticastSubscriber(GROUP, port, '127.0.0.1', resend_port, '127.0.0.1', gap_timeout=2)
+    except OSError as e:
+        publisher.close()
+        pytest.skip(f'multicast is not available on loopback: {e}')
+    time.sleep(0.1)
+    yield publisher, subscriber, port, resend_port
+    subscriber.close()
+    publisher.close()
+    listener.join(timeout=1)
+    assert not listener.is_alive()
+
+
+def receive(subscriber: MulticastSubscriber, count: int, timeout: float = 3) -> list:
+    updates = []
+    deadline = time.monotonic() + timeout
+    while len(updates) < count and time.monotonic() < deadline:
+        updates.extend(subscriber.receive(timeout=0.2))
+    return updates
+
+
+def publish_dropped(publisher: MulticastPublisher, weight: int) -> None:
+    # датаграмма попадает в историю, но уходит на порт, который никто не слушает
+    group, port = publisher.group, publisher.port
+    publisher.group, publisher.port = '127.0.0.1', free_udp_port()
+    try:
+        publisher.publish_weight(weight)
+    finally:
+        publisher.group, publisher.port = group, port
+
+
+def test_dropped_datagram_is_recovered(loopback):
+    publisher, subscriber, *_ = loopback
+    publisher.publish_angles(10, 1, 2)
+    publish_dropped(publisher, 80)
+    publisher.publish_height(40)
+    updates = receive(subscriber, 3)
+    assert updates == [(1, 'angles', [10, 1, 2]), (2, 'weight', [80, 0, 0]), (3, 'height', [40, 0, 0])]
+    assert subscriber.lost == 0
+
+
+def test_dropped_last_datagram_is_recovered_by_heartbeat(loopback):
+    publisher, subscriber, *_ = loopback
+    publisher.publish_weight(80)
+    publish_dropped(publisher, 90)
+    updates = receive(subscriber, 2)
+    assert updates == [(1, 'weight', [80, 0, 0]), (2, 'weight', [90, 0, 0])]
+    assert subscriber.lost == 0
+
+
+def test_restarted_server_is_followed(loopback):
+    publisher, subscriber, port, resend_port = loopback
+    for weight in (80, 90, 100):
+        publisher.publish_weight(weight)
+    assert len(receive(subscriber, 3)) == 3
+    publisher.close()
+    restarted = MulticastPublisher(GROUP, port, resend_port, '127.0.0.1')
+    try:
+        restarted.publish_height(50)
+        assert receive(subscriber, 1) == [(1, 'height', [50, 0, 0])]
+    finally:
+        restarted.close()
+
+
+def test_resend_is_limited_to_history():
+    publisher = MulticastPublisher(GROUP, free_udp_port(), free_udp_port(), '127.0.0.1', history=1000)
+    for _ in range(1000):
+        publisher.publish_weight(80)
+    start = time.perf_counter()
+    datagrams = publisher.resend_datagrams(publisher.session, 0, 0xFFFFFFFF)
+    assert time.perf_counter() - start < 0.1
+    assert len(datagrams) == RESEND_LIMIT
+    assert publisher.resend_datagrams(publisher.session, 2000, 0xFFFFFFFF) == []
+    assert publisher.resend_datagrams(publisher.session + 1, 1, 10) == []
+    publisher.close()
@@ -0,0 +1,80 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip('fastapi')
+pytest.importorskip('httpx')
+
+from fastapi.testclient import TestClient
+
+from lab1.tppo_server_6121 import BedReanimation
+from lab2.tppo_rest_6121 import app, create_bed, wait_bed_change
+
+
+@pytest.fixture
+def client(tmp_path):
+    device_file = tmp_path / 'device.csv'
+    device_file.write_text('10,0,5,40,80')
+    app.state.bed_factory = lambda: BedReanimation(str(device_file))
+    with TestClient(app) as client:
+        yield client
+    app.state.bed_factory = create_bed
+
+
+def test_changes_timeout_and_current_state(client):
+    bed = app.state.bed
+    # listen_file применяет углы, высоту и вес из файла устройства
+    assert bed.wait_change(2, 3)
+    response = client.get('/api/v1/reanimation-bed/changes', params={'version': bed.version, 'timeout': 0})
+    assert response.json()['changed'] is False
+    response = client.get('/api/v1/reanimation-bed/changes', params={'version': -1, 'timeout': 0})
+    assert response.json()['changed'] is True
+
+
+def test_cancelled_long_poll_removes_waiter(tmp_path):
+    bed = BedReanimation(str(tmp_path / 'device.csv'))
+
+    async def cancel_wait():
+        task = asyncio.create_task(wait_bed_change(bed, bed.version, 10))
+        await asyncio.sleep(0.01)
+        assert len(bed.version_waiters) == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_wait())
+    assert bed.version_waiters == []
+    bed.set_weight(80)
+    assert bed.version == 1
+
+
+class SlowStoppingBed(BedReanimation):
+
+    def listen_file(self):
+        self.stopped.wait()
+        time.sleep(0.3)
+
+
+def test_shutdown_does_not_block_event_loop(tmp_path):
+    app.state.bed_factory = lambda: SlowStoppingBed(str(tmp_path / 'device.csv'))
+    ticks = []
+
+    async def ticker():
+        while True:
+            await asyncio.sleep(0.01)
+            ticks.append(1)
+
+    async def run():
+        async with app.router.lifespan_context(app):
+            task = asyncio.create_task(ticker())
+            await asyncio.sleep(0)
+            ticks.clear()
+        task.cancel()
+        return len(ticks)
+
+    try:
+        # пока поток устройства завершается, цикл событий продолжает работать
+        assert asyncio.run(run()) >= 10
+    finally:
+        app.state.bed_factory = create_bed
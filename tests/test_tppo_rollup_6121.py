@@ -0,0 +1,59 @@
+import pytest
+
+from lab1.tppo_rollup_6121 import Rollup
+
+
+def test_change_on_bucket_boundary_starts_new_bucket():
+    rollup = Rollup(resolutions=(60,))
+    rollup.add('weight', 80, 0)
+    rollup.add('weight', 90, 59.5)
+    rollup.add('weight', 100, 60)
+    buckets = rollup.query('weight', 0, 119, now=120)
+    assert [bucket['start'] for bucket in buckets] == [0, 60]
+    assert (buckets[0]['min'], buckets[0]['max'], buckets[0]['last'], buckets[0]['count']) == (80, 90, 90, 2)
+    assert (buckets[1]['min'], buckets[1]['max'], buckets[1]['last'], buckets[1]['count']) == (100, 100, 100, 1)
+
+
+def test_mean_is_weighted_by_time():
+    rollup = Rollup(resolutions=(60,))
+    rollup.add('weight', 80, 0)
+    rollup.add('weight', 200, 1)
+    bucket, = rollup.query('weight', 0, 59, now=60)
+    assert bucket['mean'] == pytest.approx((80 * 1 + 200 * 59) / 60)
+
+
+def test_steady_value_fills_buckets_of_the_range():
+    rollup = Rollup(resolutions=(1, 60))
+    rollup.add('height', 40, 10)
+    buckets = rollup.query('height', 100, 179, resolution=60, now=200)
+    assert [bucket['start'] for bucket in buckets] == [60, 120]
+    assert all(bucket['last'] == 40 and bucket['mean'] == 40 and bucket['count'] == 0 for bucket in buckets)
+    assert [bucket['start'] for bucket in rollup.query('height', 197, 199, resolution=1, now=200)] == [197, 198, 199]
+
+
+def test_retention_evicts_oldest_buckets():
+    rollup = Rollup(resolutions=(1,), retention=5)
+    for second in range(10):
+        rollup.add('back', second, second)
+    buckets = rollup.query('back', 0, 9, resolution=1, now=10)
+    assert [bucket['start'] for bucket in buckets] == [5, 6, 7, 8, 9]
+
+
+def test_long_steady_period_creates_at_most_retention_buckets():
+    rollup = Rollup(resolutions=(1,), retention=100)
+    rollup.add('hip', 5, 0)
+    rollup.query('hip', 0, 10 ** 6, resolution=1, now=10 ** 6)
+    assert len(rollup.buckets[1]['hip']) == 100
+
+
+def test_pick_resolution():
+    rollup = Rollup()
+    assert rollup.pick_resolution(0, 300) == 1
+    assert rollup.pick_resolution(0, 8 * 3600) == 60
+    assert rollup.pick_resolution(0, 7 * 24 * 3600) == 3600
+    assert rollup.pick_resolution(0, 365 * 24 * 3600) == 3600
+
+
+def test_unsupported_resolution():
+    with pytest.raises(ValueError):
+        Rollup().query('weight', 0, 60, resolution=5)
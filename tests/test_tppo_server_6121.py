@@ -0,0 +1,50 @@
+import threading
+
+from lab1.tppo_server_6121 import BedReanimation
+
+
+def make_bed(tmp_path) -> BedReanimation:
+    return BedReanimation(str(tmp_path / 'device.csv'))
+
+
+def test_setters_bump_version(tmp_path):
+    bed = make_bed(tmp_path)
+    bed.set_angles(10, 0, 5)
+    bed.set_height(40)
+    bed.set_weight(80)
+    bed.set_weight(301)
+    assert bed.version == 3
+    assert bed.get_state() == b'3,10,0,5,40,80'
+
+
+def test_wait_change(tmp_path):
+    bed = make_bed(tmp_path)
+    assert not bed.wait_change(0, 0.05)
+    threading.Timer(0.05, bed.set_weight, args=(80,)).start()
+    assert bed.wait_change(0, 2)
+    assert bed.wait_change(0, 0)
+
+
+def test_failing_waiter_does_not_stop_others(tmp_path):
+    bed = make_bed(tmp_path)
+    woken = []
+
+    def failing(version):
+        raise RuntimeError('Event loop is closed')
+
+    bed.add_version_waiter(0, failing)
+    bed.add_version_waiter(0, woken.append)
+    bed.set_height(40)
+    assert woken == [1]
+    assert bed.height == 40
+    assert bed.version_waiters == []
+
+
+def test_only_changed_angles_are_counted_in_rollup(tmp_path):
+    bed = make_bed(tmp_path)
+    bed.set_angles(10, 0, 5)
+    bed.set_angles(20, 0, 5)
+    bed.set_angles(30, 0, 5)
+    counts = {name: sum(bucket['count'] for bucket in bed.rollup.query(name, 0, 2 ** 40, resolution=3600))
+              for name in ('back', 'hip', 'ankle')}
+    assert counts == {'back': 3, 'hip': 1, 'ankle': 1}